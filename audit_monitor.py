@@ -2,155 +2,334 @@
 
 import os
 import sys
+import signal
+import socket
 import time
 import csv
-import subprocess
+import gzip
+import io
+import shutil
 import threading
+import queue
+from collections import OrderedDict, deque
 import psutil
 import json
+from enum import Enum
 from datetime import datetime
 from pathlib import Path
 from watchdog.observers import Observer
+from watchdog.observers.polling import PollingObserver
 from watchdog.events import FileSystemEventHandler
+from google.api_core.exceptions import PreconditionFailed
+from google.cloud import storage
+from google.cloud.storage.retry import DEFAULT_RETRY
+
+# Shared GCS client (one HTTP session), created on first upload
+_GCS = None
+
+CSV_HEADER = ['timestamp', 'event_type', 'git_repo', 'file_path', 'command', 'output', 'user', 'tool', 'prompt']
+
+class AuditFsyncMode(Enum):
+    """When the CSV writer forces written rows to disk"""
+    NONE = 'none'              # leave it to the OS page cache
+    PER_BATCH = 'per_batch'    # one fsync after each written batch
+    PER_RECORD = 'per_record'  # fsync after every row
 
 class GitPythonMonitor:
+    # Exact process names that are always monitored
+    NAME_TYPES = {'node': 'nodejs', 'npm': 'nodejs', 'yarn': 'nodejs', 'npx': 'nodejs', 'pnpm': 'nodejs'}
+    # Directories never searched for repositories
+    SCAN_SKIP_DIRS = frozenset({'node_modules', '.venv', 'venv', '__pycache__'})
+    
     def __init__(self, log_file="/tmp/audit/python_audit.csv"):
         self.log_file = log_file
-        self.bucket_path = "gs://othertales-audit"
+        self.bucket_name = "othertales-audit"
         self.upload_interval = 300  # 5 minutes
         self.git_dirs = set()
-        self.active_processes = {}
+        self.max_active_processes = 4096
+        self.active_processes = OrderedDict()  # oldest first
+        self._known_pids = set()
+        self._recheck_pids = {}  # unmatched PID -> time first seen
+        self.recheck_window = 10  # seconds a new PID is re-inspected for an exec
+        self.poll_interval = 1  # seconds
+        self.claude_poll_ticks = 10  # parse Claude Code logs every 10th tick
+        self._claude_offsets = {}  # log path -> (inode, bytes already parsed)
+        self.repo_cache_size = 4096
+        self._repo_cache = OrderedDict()  # directory -> repository root, least recent first
+        self._repo_cache_lock = threading.Lock()
+        
+        # Batched CSV writer settings
+        self.queue_size = 16384
+        self.batch_size = 64
+        self.drop_report_interval = 1.0  # seconds
+        self.dropped_events = 0
+        self.fsync_mode = self._get_fsync_mode()
+        # deque append/popleft are atomic under the GIL, so producers never take a lock
+        self._ring = deque(maxlen=self.queue_size)
+        self._wakeup = threading.Event()
+        self._stopping = False
         
         # Ensure log directory exists
         os.makedirs(os.path.dirname(log_file), exist_ok=True)
         
-        # Initialize CSV with headers if not exists
-        if not os.path.exists(log_file):
-            with open(log_file, 'w', newline='') as f:
-                writer = csv.writer(f)
-                writer.writerow(['timestamp', 'event_type', 'git_repo', 'file_path', 'command', 'output', 'user', 'tool', 'prompt'])
+        # Open the CSV (with headers if new); guarded so uploads can rotate it
+        self._log_lock = threading.Lock()
+        self._open_log()
+        
+        # Single writer thread owns the log file handle
+        self._writer_thread = threading.Thread(target=self._writer_loop, daemon=True)
+        self._writer_thread.start()
+    
+    def _get_fsync_mode(self):
+        """Read the fsync policy from AUDIT_FSYNC_MODE"""
+        value = os.getenv('AUDIT_FSYNC_MODE', AuditFsyncMode.PER_BATCH.value)
+        try:
+            return AuditFsyncMode(value.strip().lower())
+        except ValueError:
+            print(f"Unknown AUDIT_FSYNC_MODE '{value}', using {AuditFsyncMode.PER_BATCH.value}")
+            return AuditFsyncMode.PER_BATCH
     
     def find_git_directories(self):
         """Find all .git directories in the system"""
-        for root, dirs, files in os.walk('/home'):
-            if '.git' in dirs:
-                self.git_dirs.add(os.path.join(root, '.git'))
-                # Also monitor the parent directory
-                self.git_dirs.add(root)
-    
-    def log_event(self, event_type, git_repo, file_path, command="", output="", tool="", prompt=""):
-        """Log an event to CSV"""
-        timestamp = datetime.now().isoformat()
+        for root in self._iter_repos('/home'):
+            self.git_dirs.add(os.path.join(root, '.git'))
+            # Also monitor the parent directory
+            self.git_dirs.add(root)
+    
+    def _iter_repos(self, root):
+        """Yield repository roots under root, without descending into repos or skipped dirs"""
+        try:
+            with os.scandir(root) as it:
+                subdirs = []
+                for entry in it:
+                    if entry.name == '.git':
+                        yield root
+                        return
+                    if entry.name not in self.SCAN_SKIP_DIRS and entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+        except OSError:
+            return
+        for path in subdirs:
+            yield from self._iter_repos(path)
+    
+    def log_event(self, event_type, git_repo, file_path, command="", output="", tool="", prompt="", timestamp=None):
+        """Buffer an event for the CSV writer thread; timestamp is epoch nanoseconds"""
+        # Formatted by the writer thread to keep producers cheap
+        if timestamp is None:
+            timestamp = time.time_ns()
         user = os.getenv('USER', 'unknown')
         
-        with open(self.log_file, 'a', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow([timestamp, event_type, git_repo, file_path, command, output, user, tool, prompt])
+        if len(self._ring) >= self.queue_size:
+            # The deque discards its oldest row to make room
+            self.dropped_events += 1
+        self._ring.append((timestamp, event_type, git_repo, file_path, command, output, user, tool, prompt))
+        self._wakeup.set()
+    
+    def _open_log(self):
+        """Open the log file for appending, writing headers if it is new"""
+        is_new = not os.path.exists(self.log_file) or os.path.getsize(self.log_file) == 0
+        self._log_fd = os.open(self.log_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        if is_new:
+            os.write(self._log_fd, self._format_row(CSV_HEADER))
+        self._log_has_rows = not is_new
+    
+    def _format_timestamp(self, ns):
+        """Render an epoch-nanosecond timestamp as local ISO time"""
+        seconds, remainder = divmod(ns, 1_000_000_000)
+        return datetime.fromtimestamp(seconds).replace(microsecond=remainder // 1000).isoformat()
+    
+    def _format_row(self, row):
+        """Encode a row exactly as csv.writer would"""
+        # Most rows need no quoting, so skip csv.writer unless a field has special characters
+        line = ','.join(row)
+        if (line.count(',') == len(row) - 1 and
+                '"' not in line and '\n' not in line and '\r' not in line):
+            line += '\r\n'
+        else:
+            buf = io.StringIO()
+            csv.writer(buf).writerow(row)
+            line = buf.getvalue()
+        return line.encode('utf-8', 'surrogateescape')
+    
+    def rotate_log(self):
+        """Move the current log aside and start a fresh one; returns the rotated path"""
+        with self._log_lock:
+            if not self._log_has_rows:
+                return None
+            os.close(self._log_fd)
+            base, ext = os.path.splitext(self.log_file)
+            # Hostname keeps chunk names unique across hosts sharing the bucket
+            rotated = f"{base}_{socket.gethostname()}_{datetime.now().strftime('%Y%m%d_%H%M%S')}{ext}"
+            os.rename(self.log_file, rotated)
+            self._open_log()
+        return rotated
+    
+    def _writer_loop(self):
+        """Drain buffered events and append them to the CSV in batches"""
+        reported_drops = 0
+        last_report = time.monotonic()
+        while True:
+            self._wakeup.wait(timeout=self.drop_report_interval)
+            self._wakeup.clear()
+            # Read before draining so rows buffered before close() are always written
+            stopping = self._stopping
+            
+            while self._ring:
+                batch = []
+                while self._ring and len(batch) < self.batch_size:
+                    batch.append(self._ring.popleft())
+                self._write_batch(batch)
+            
+            # Every event sets _wakeup, so rate-limit the report explicitly
+            now = time.monotonic()
+            if self.dropped_events != reported_drops and (stopping or now - last_report >= self.drop_report_interval):
+                print(f"Audit buffer full, dropped {self.dropped_events - reported_drops} events")
+                reported_drops = self.dropped_events
+                last_report = now
+            
+            if stopping:
+                return
+    
+    def close(self):
+        """Write out all buffered events, fsync and close the log"""
+        self._stopping = True
+        self._wakeup.set()
+        self._writer_thread.join()
+        with self._log_lock:
+            os.fsync(self._log_fd)
+            os.close(self._log_fd)
+    
+    def _write_batch(self, batch):
+        """Append a batch of rows to the log, honouring the fsync policy"""
+        try:
+            lines = [self._format_row((self._format_timestamp(row[0]),) + row[1:]) for row in batch]
+            with self._log_lock:
+                fd = self._log_fd
+                if self.fsync_mode is AuditFsyncMode.PER_RECORD:
+                    for line in lines:
+                        os.write(fd, line)
+                        os.fsync(fd)
+                else:
+                    # One syscall for the whole batch
+                    os.writev(fd, lines)
+                    if self.fsync_mode is AuditFsyncMode.PER_BATCH:
+                        os.fsync(fd)
+                self._log_has_rows = True
+        except Exception as e:
+            print(f"Error writing audit log: {e}")
     
     def monitor_processes(self):
-        """Monitor running Python and Node.js processes in git directories"""
+        """Poll processes, git commits and Claude Code logs from one scheduler thread"""
+        tick = 0
         while True:
             try:
-                for proc in psutil.process_iter(['pid', 'name', 'cmdline', 'cwd']):
-                    try:
-                        proc_info = proc.info
-                        proc_name = proc_info['name'] or ''
-                        
-                        # Check for Python, Node.js, npm, yarn processes
-                        is_monitored = (
-                            'python' in proc_name.lower() or
-                            proc_name.lower() in ['node', 'npm', 'yarn', 'npx', 'pnpm'] or
-                            'code' in proc_name.lower()  # VSCode processes
-                        )
-                        
-                        if is_monitored:
-                            cwd = proc_info.get('cwd', '')
-                            if self.is_in_git_repo(cwd):
-                                pid = proc_info['pid']
-                                cmdline = ' '.join(proc_info['cmdline'] or [])
-                                
-                                if pid not in self.active_processes:
-                                    self.active_processes[pid] = {
-                                        'start_time': time.time(),
-                                        'cmdline': cmdline,
-                                        'cwd': cwd,
-                                        'logged': False,
-                                        'proc_type': self._get_process_type(proc_name, cmdline)
-                                    }
-                                    
-                                    # Log the start of process execution
-                                    git_repo = self.find_git_repo(cwd)
-                                    event_type = f"{self.active_processes[pid]['proc_type']}_start"
-                                    tool = self._get_tool_name(proc_name, cmdline)
-                                    self.log_event(event_type, git_repo, cwd, cmdline, tool=tool)
-                                    
-                    except (psutil.NoSuchProcess, psutil.AccessDenied):
-                        continue
-                
-                # Clean up finished processes
-                finished_pids = []
-                for pid, info in self.active_processes.items():
-                    if not psutil.pid_exists(pid):
-                        finished_pids.append(pid)
-                        # Log process completion
-                        runtime = time.time() - info['start_time']
-                        git_repo = self.find_git_repo(info['cwd'])
-                        event_type = f"{info['proc_type']}_end"
-                        tool = self._get_tool_name_from_cmdline(info['cmdline'])
-                        self.log_event(event_type, git_repo, info['cwd'], info['cmdline'], f"Runtime: {runtime:.2f}s", tool=tool)
-                
-                for pid in finished_pids:
-                    del self.active_processes[pid]
-                    
+                self._tick()
             except Exception as e:
                 print(f"Error monitoring processes: {e}")
             
-            time.sleep(2)
+            if tick % self.claude_poll_ticks == 0:
+                self.monitor_claude_code_prompts()
+            tick += 1
+            
+            time.sleep(self.poll_interval)
+    
+    def _tick(self):
+        """Dispatch process and git commit events from a single /proc snapshot"""
+        # One pass over /proc; only PIDs that appeared since the last tick need inspecting
+        current_pids = set(psutil._psplatform.ppid_map())
+        now = time.time()
+        
+        for pid in current_pids - self._known_pids:
+            self._recheck_pids[pid] = now
+        
+        # Young PIDs that didn't match yet are inspected again, since wrappers
+        # often exec into python/node/git shortly after starting
+        for pid, first_seen in list(self._recheck_pids.items()):
+            if (pid not in current_pids or now - first_seen > self.recheck_window
+                    or self._inspect_process(pid)):
+                del self._recheck_pids[pid]
+        
+        # Log completion for tracked processes that have gone away
+        for pid in set(self.active_processes) - current_pids:
+            info = self.active_processes.pop(pid)
+            runtime = time.time() - info['start_time']
+            event_type = f"{info['proc_type']}_end"
+            self.log_event(event_type, info['git_repo'], info['cwd'], info['cmdline'], f"Runtime: {runtime:.2f}s", tool=info['tool'])
+        
+        self._known_pids = current_pids
+    
+    def _inspect_process(self, pid):
+        """Track or log a process; returns False if it may still exec into a monitored one"""
+        try:
+            proc = psutil.Process(pid)
+            with proc.oneshot():
+                proc_name = proc.name() or ''
+                
+                if proc_name == 'git':
+                    self._check_git_commit(proc)
+                    return True
+                
+                # Check for Python, Node.js, npm, yarn and VSCode processes
+                name_lower = proc_name.lower()
+                proc_type = self._classify(name_lower)
+                if proc_type is None:
+                    return False
+                
+                cwd = proc.cwd()
+                git_repo = self.repo_for(cwd)
+                if git_repo is None:
+                    return True
+                cmdline = ' '.join(proc.cmdline() or [])
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            return True
+        
+        info = self.active_processes[pid] = {
+            'start_time': time.time(),
+            'cmdline': cmdline,
+            'cwd': cwd,
+            'git_repo': git_repo,
+            'logged': False,
+            'proc_type': proc_type,
+            'tool': self._get_tool_name(proc_type, name_lower, cmdline.lower())
+        }
+        if len(self.active_processes) > self.max_active_processes:
+            # Stop tracking the oldest process to keep memory bounded
+            self.active_processes.popitem(last=False)
+        
+        # Log the start of process execution
+        event_type = f"{info['proc_type']}_start"
+        self.log_event(event_type, git_repo, cwd, cmdline, tool=info['tool'])
+        return True
+    
+    def _check_git_commit(self, proc):
+        """Log a git commit run inside a repository"""
+        cwd = proc.cwd()
+        git_repo = self.repo_for(cwd)
+        if git_repo is not None:
+            cmdline = ' '.join(proc.cmdline() or [])
+            if 'commit' in cmdline:
+                self.log_event('git_commit', git_repo, cwd, cmdline)
     
-    def _get_process_type(self, proc_name, cmdline):
-        """Determine the type of process for logging"""
-        proc_name_lower = proc_name.lower()
-        if 'python' in proc_name_lower:
+    def _classify(self, name_lower):
+        """Return the process type for a monitored process name, or None"""
+        if 'python' in name_lower:
             return 'python'
-        elif proc_name_lower in ['node', 'npm', 'yarn', 'npx', 'pnpm']:
-            return 'nodejs'
-        elif 'code' in proc_name_lower:
+        proc_type = self.NAME_TYPES.get(name_lower)
+        if proc_type is not None:
+            return proc_type
+        if 'code' in name_lower:
             return 'vscode'
-        elif 'claude' in cmdline.lower():
-            return 'claude_code'
-        return 'unknown'
+        return None
     
-    def _get_tool_name(self, proc_name, cmdline):
-        """Extract tool name from process info"""
-        proc_name_lower = proc_name.lower()
-        if 'code' in proc_name_lower:
+    def _get_tool_name(self, proc_type, name_lower, cmdline_lower):
+        """Extract tool name from an already classified process"""
+        if proc_type == 'vscode':
             return 'vscode'
-        elif 'claude' in cmdline.lower():
+        elif 'claude' in cmdline_lower:
             return 'claude_code'
-        elif proc_name_lower in ['npm', 'yarn', 'npx', 'pnpm']:
-            return proc_name_lower
-        elif proc_name_lower == 'node':
-            return 'node'
-        elif 'python' in proc_name_lower:
-            return 'python'
-        return proc_name
-    
-    def _get_tool_name_from_cmdline(self, cmdline):
-        """Extract tool name from command line"""
-        cmdline_lower = cmdline.lower()
-        if 'claude' in cmdline_lower:
-            return 'claude_code'
-        elif 'code' in cmdline_lower:
-            return 'vscode'
-        elif any(tool in cmdline_lower for tool in ['npm', 'yarn', 'npx', 'pnpm']):
-            for tool in ['npm', 'yarn', 'npx', 'pnpm']:
-                if tool in cmdline_lower:
-                    return tool
-        elif 'node' in cmdline_lower:
-            return 'node'
-        elif 'python' in cmdline_lower:
-            return 'python'
-        return 'unknown'
+        elif proc_type == 'nodejs':
+            return name_lower
+        return 'python'
     
     def monitor_claude_code_prompts(self):
         """Monitor Claude Code activity by watching for prompt inputs"""
@@ -171,80 +350,181 @@ class GitPythonMonitor:
                     continue
     
     def _parse_claude_logs(self, log_path):
-        """Parse Claude Code logs for user prompts"""
+        """Parse lines appended to a Claude Code log since the last pass for user prompts"""
         try:
-            with open(log_path, 'r') as f:
-                for line in f:
-                    if 'user:' in line.lower() or 'prompt:' in line.lower():
-                        if self.is_in_git_repo(os.getcwd()):
-                            git_repo = self.find_git_repo(os.getcwd())
-                            prompt_text = line.strip()[:200]  # Limit prompt length
-                            self.log_event('claude_prompt', git_repo, os.getcwd(), 
-                                         command='', output='', tool='claude_code', prompt=prompt_text)
+            st = os.stat(log_path)
+            inode, offset = self._claude_offsets.get(log_path, (None, 0))
+            if inode != st.st_ino or st.st_size < offset:
+                # New, rotated or truncated file: start from the beginning
+                offset = 0
+            if st.st_size == offset:
+                self._claude_offsets[log_path] = (st.st_ino, offset)
+                return
+            
+            with open(log_path, 'rb') as f:
+                f.seek(offset)
+                data = f.read()
+            # Leave a partially written last line for the next pass
+            end = data.rfind(b'\n') + 1
+            self._claude_offsets[log_path] = (st.st_ino, offset + end)
+            
+            for line in data[:end].splitlines():
+                line_lower = line.lower()
+                if b'user:' in line_lower or b'prompt:' in line_lower:
+                    cwd = os.getcwd()
+                    git_repo = self.repo_for(cwd)
+                    if git_repo is not None:
+                        prompt_text = line.decode('utf-8', 'replace').strip()[:200]  # Limit prompt length
+                        self.log_event('claude_prompt', git_repo, cwd, 
+                                     command='', output='', tool='claude_code', prompt=prompt_text)
         except Exception:
             pass
     
-    def is_in_git_repo(self, path):
-        """Check if path is within a git repository"""
-        if not path:
-            return False
-        current = Path(path)
-        for parent in [current] + list(current.parents):
-            if (parent / '.git').exists():
-                return True
-        return False
-    
-    def find_git_repo(self, path):
-        """Find the root of the git repository"""
-        if not path:
-            return ""
-        current = Path(path)
-        for parent in [current] + list(current.parents):
-            if (parent / '.git').exists():
-                return str(parent)
-        return path
+    def repo_for(self, dir_path):
+        """Return the root of the git repository containing dir_path, or None"""
+        # Only hits are cached: a directory can become a repo without any watched
+        # .git event, so "not a repo" is always re-checked
+        path = dir_path
+        while path:
+            with self._repo_cache_lock:
+                repo = self._repo_cache.get(path)
+            if repo is not None:
+                break
+            if os.path.exists(os.path.join(path, '.git')):
+                repo = path
+                break
+            parent = os.path.dirname(path)
+            if parent == path:
+                return None
+            path = parent
+        else:
+            return None
+        
+        with self._repo_cache_lock:
+            self._repo_cache[dir_path] = repo
+            self._repo_cache.move_to_end(dir_path)
+            if len(self._repo_cache) > self.repo_cache_size:
+                self._repo_cache.popitem(last=False)
+        return repo
+    
+    def invalidate_repo_cache(self):
+        """Forget cached repository lookups after a .git directory appears or disappears"""
+        with self._repo_cache_lock:
+            self._repo_cache.clear()
 
 class GitFileHandler(FileSystemEventHandler):
+    SKIP_SUFFIXES = ('.swp', '.tmp', '.lock', '.DS_Store', '~', '.bak')
+    
     def __init__(self, monitor):
         self.monitor = monitor
-        self.last_modified = {}  # Track to avoid duplicate events
+        self.watcher = None  # set by RepoWatcher
+        self.max_pending = 8192
+        self.coalesce_interval = 1.0  # seconds
+        # path -> [first_ns, count, git_repo, tool], oldest first
+        self._pending = OrderedDict()
+        self._pending_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flush_thread = threading.Thread(target=self._flush_loop, daemon=True)
+        self._flush_thread.start()
+        
+        # Files held open by VSCode, refreshed in the background
+        self.vscode_refresh_interval = 5  # seconds
+        self._vscode_paths = set()
+        self._vscode_lock = threading.RLock()
+        self._vscode_thread = threading.Thread(target=self._refresh_vscode_paths, daemon=True)
+        self._vscode_thread.start()
     
     def on_modified(self, event):
         if not event.is_directory:
             # Skip temporary files and system files
             if self._should_skip_file(event.src_path):
                 return
-                
-            if self.monitor.is_in_git_repo(event.src_path):
-                # Debounce rapid file changes
-                current_time = time.time()
-                if event.src_path in self.last_modified:
-                    if current_time - self.last_modified[event.src_path] < 1.0:
-                        return
-                self.last_modified[event.src_path] = current_time
-                
-                git_repo = self.monitor.find_git_repo(event.src_path)
-                tool = self._detect_editing_tool(event.src_path)
-                self.monitor.log_event('file_edit', git_repo, event.src_path, tool=tool)
+            
+            path = event.src_path
+            first_ns = time.time_ns()
+            with self._pending_lock:
+                entry = self._pending.get(path)
+                if entry is not None:
+                    # Coalesce rapid file changes into one row per window
+                    entry[1] += 1
+                    self._pending.move_to_end(path)
+                    return
+            
+            git_repo = self.monitor.repo_for(os.path.dirname(path))
+            if git_repo is not None:
+                tool = self._detect_editing_tool(path)
+                evicted = None
+                with self._pending_lock:
+                    entry = self._pending.get(path)
+                    if entry is not None:
+                        entry[1] += 1
+                        self._pending.move_to_end(path)
+                    else:
+                        self._pending[path] = [first_ns, 1, git_repo, tool]
+                        if len(self._pending) > self.max_pending:
+                            evicted = self._pending.popitem(last=False)
+                if evicted is not None:
+                    self._log_edit(*evicted)
+    
+    def _flush_loop(self):
+        """Write one file_edit row per modified path every coalesce interval"""
+        while True:
+            time.sleep(self.coalesce_interval)
+            self.flush()
+    
+    def flush(self):
+        """Log all pending coalesced edits"""
+        # Held while logging so a shutdown flush waits for one already in progress
+        with self._flush_lock:
+            with self._pending_lock:
+                pending, self._pending = self._pending, OrderedDict()
+            for item in pending.items():
+                self._log_edit(*item)
+    
+    def _log_edit(self, path, entry):
+        first_ns, count, git_repo, tool = entry
+        # Stamp the row with the first edit so it orders correctly against immediate events
+        self.monitor.log_event('file_edit', git_repo, path, command=f'count={count}', tool=tool, timestamp=first_ns)
     
     def on_created(self, event):
-        if not event.is_directory:
-            if self._should_skip_file(event.src_path):
-                return
-                
-            if self.monitor.is_in_git_repo(event.src_path):
-                git_repo = self.monitor.find_git_repo(event.src_path)
-                tool = self._detect_editing_tool(event.src_path)
-                self.monitor.log_event('file_create', git_repo, event.src_path, tool=tool)
+        if event.is_directory:
+            self._check_git_dir(event.src_path)
+            return
+        
+        if self._should_skip_file(event.src_path):
+            return
+            
+        git_repo = self.monitor.repo_for(os.path.dirname(event.src_path))
+        if git_repo is not None:
+            tool = self._detect_editing_tool(event.src_path)
+            self.monitor.log_event('file_create', git_repo, event.src_path, tool=tool)
+    
+    def on_deleted(self, event):
+        if event.is_directory:
+            self._check_git_dir(event.src_path)
+            # watchdog stops a watch whose root is deleted; let it be scheduled again
+            if self.watcher is not None:
+                self.watcher.forget(event.src_path)
+    
+    def on_moved(self, event):
+        if event.is_directory and self.watcher is not None:
+            self.watcher.forget(event.src_path)
+    
+    def _check_git_dir(self, dir_path):
+        """Drop cached repository lookups when a nested repository is created or removed"""
+        if os.path.basename(dir_path.rstrip('/')) == '.git':
+            self.monitor.invalidate_repo_cache()
     
     def _should_skip_file(self, file_path):
         """Skip temporary files, lock files, and system files"""
-        skip_patterns = [
-            '.git/', '.swp', '.tmp', '.lock', '.DS_Store', 
-            '__pycache__/', 'node_modules/', '.vscode/',
-            '~', '.bak'
-        ]
-        return any(pattern in file_path for pattern in skip_patterns)
+        # Inline checks benchmark faster than a combined regex or any() over a list
+        return (
+            file_path.endswith(self.SKIP_SUFFIXES) or
+            '.git/' in file_path or
+            '__pycache__/' in file_path or
+            'node_modules/' in file_path or
+            '.vscode/' in file_path
+        )
     
     def _detect_editing_tool(self, file_path):
         """Detect which tool is likely editing the file"""
@@ -252,72 +532,253 @@ class GitFileHandler(FileSystemEventHandler):
         if '.vscode' in file_path or file_path.endswith('.code-workspace'):
             return 'vscode'
         
-        # Check running processes to see what might be editing
-        try:
-            for proc in psutil.process_iter(['name', 'open_files']):
-                try:
-                    proc_info = proc.info
-                    if proc_info['name'] and 'code' in proc_info['name'].lower():
-                        open_files = proc_info.get('open_files', [])
-                        if any(f.path == file_path for f in open_files if hasattr(f, 'path')):
-                            return 'vscode'
-                except (psutil.NoSuchProcess, psutil.AccessDenied):
-                    continue
-        except Exception:
-            pass
-            
-        return 'unknown'
-
-class GitCommitMonitor:
-    def __init__(self, monitor):
-        self.monitor = monitor
+        with self._vscode_lock:
+            vscode_paths = self._vscode_paths
+        return 'vscode' if file_path in vscode_paths else 'unknown'
     
-    def monitor_git_commands(self):
-        """Monitor git commands by watching git directories"""
+    def _refresh_vscode_paths(self):
+        """Periodically snapshot the files VSCode processes have open"""
         while True:
+            paths = set()
             try:
-                for proc in psutil.process_iter(['pid', 'name', 'cmdline', 'cwd']):
+                for proc in psutil.process_iter(['name']):
                     try:
-                        proc_info = proc.info
-                        if proc_info['name'] == 'git':
-                            cwd = proc_info.get('cwd', '')
-                            if self.monitor.is_in_git_repo(cwd):
-                                cmdline = ' '.join(proc_info['cmdline'] or [])
-                                if 'commit' in cmdline:
-                                    git_repo = self.monitor.find_git_repo(cwd)
-                                    self.monitor.log_event('git_commit', git_repo, cwd, cmdline)
+                        name = proc.info['name']
+                        if name and 'code' in name.lower():
+                            with proc.oneshot():
+                                paths.update(f.path for f in proc.open_files())
                     except (psutil.NoSuchProcess, psutil.AccessDenied):
                         continue
             except Exception as e:
-                print(f"Error monitoring git commands: {e}")
+                print(f"Error scanning VSCode open files: {e}")
             
-            time.sleep(1)
+            with self._vscode_lock:
+                self._vscode_paths = paths
+            time.sleep(self.vscode_refresh_interval)
+
+class RepoWatcher:
+    """Schedule one recursive watch per git repository instead of all of /home"""
+    
+    NETWORK_FS_TYPES = {'nfs', 'nfs4', 'cifs', 'smb3', 'smbfs', 'fuse.sshfs'}
+    DISCOVERY_DEPTH = 3  # down to /home/<user>/<a>/<b>
+    
+    def __init__(self, handler, root='/home'):
+        self.handler = handler
+        self.root = root
+        self.observer = Observer()
+        # inotify does not see changes made on other NFS/CIFS clients
+        self.polling_observer = PollingObserver()
+        self.repo_watches = {}
+        self.discovery_watches = {}
+        self.discovery_handler = RepoDiscoveryHandler(self)
+        # Lets the file handler report deleted repository roots
+        handler.watcher = self
+        self._partitions = psutil.disk_partitions(all=True)
+        # Watch changes are applied by a single thread, fed from this queue
+        self._requests = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+    
+    def _in_watched_repo(self, path):
+        return any(path == watched or path.startswith(watched + '/') for watched in self.repo_watches)
+    
+    def _is_network_fs(self, path):
+        """Check whether path lives on a network filesystem"""
+        best = None
+        for part in self._partitions:
+            mountpoint = part.mountpoint.rstrip('/')
+            if path == part.mountpoint or path.startswith(mountpoint + '/'):
+                if best is None or len(part.mountpoint) > len(best.mountpoint):
+                    best = part
+        return best is not None and best.fstype in self.NETWORK_FS_TYPES
+    
+    def _schedule(self, handler, path, recursive):
+        """Schedule a watch, falling back to polling for network filesystems"""
+        # Observers must already be started: only then does schedule() create the
+        # inotify watch itself and raise OSError when the watch limit is reached
+        if self._is_network_fs(path):
+            return self.polling_observer.schedule(handler, path, recursive=recursive)
+        try:
+            return self.observer.schedule(handler, path, recursive=recursive)
+        except OSError as e:
+            # e.g. inotify watch limit reached
+            print(f"Falling back to polling for {path}: {e}")
+            return self.polling_observer.schedule(handler, path, recursive=recursive)
+    
+    def _unschedule(self, watch):
+        try:
+            self.observer.unschedule(watch)
+        except KeyError:
+            self.polling_observer.unschedule(watch)
+    
+    def forget(self, path):
+        """Drop watches at or below a directory that was deleted or moved away"""
+        self._requests.put((self._forget, path))
+    
+    def watch_repo(self, path):
+        """Watch a repository root recursively unless an enclosing repo is already watched"""
+        self._requests.put((self._watch_repo, path))
+    
+    def watch_discovery(self, path):
+        """Watch a directory non-recursively for new repositories"""
+        self._requests.put((self._watch_discovery, path))
+    
+    def seed_discovery(self, path):
+        """Add discovery watches for existing non-repo directories down to DISCOVERY_DEPTH"""
+        self._requests.put((self._seed_discovery, path))
+    
+    def _run(self):
+        """Apply watch requests one at a time on this thread"""
+        # Handlers run under their observer's lock and schedule()/unschedule() take
+        # observer locks too, so handlers only queue requests and never block here
+        while True:
+            func, path = self._requests.get()
+            if func is None:
+                return
+            try:
+                func(path.rstrip('/'))
+            except Exception as e:
+                print(f"Error updating watch for {path}: {e}")
+    
+    def _forget(self, path):
+        for watches in (self.repo_watches, self.discovery_watches):
+            for watched in [w for w in watches if w == path or w.startswith(path + '/')]:
+                try:
+                    self._unschedule(watches.pop(watched))
+                except KeyError:
+                    pass
+    
+    def _watch_repo(self, path):
+        if self._in_watched_repo(path):
+            return
+        # A new enclosing repo replaces any nested repo watches
+        for watched in [w for w in self.repo_watches if w.startswith(path + '/')]:
+            self._unschedule(self.repo_watches.pop(watched))
+        try:
+            self.repo_watches[path] = self._schedule(self.handler, path, recursive=True)
+        except OSError as e:
+            print(f"Error watching {path}: {e}")
+    
+    def _watch_discovery(self, path):
+        depth = len(Path(path).relative_to(self.root).parts)
+        if depth > self.DISCOVERY_DEPTH or path in self.discovery_watches or self._in_watched_repo(path):
+            return
+        try:
+            self.discovery_watches[path] = self._schedule(self.discovery_handler, path, recursive=False)
+        except OSError as e:
+            print(f"Error watching {path}: {e}")
+            return
+        # The .git directory may have been created before the watch existed
+        if os.path.isdir(os.path.join(path, '.git')):
+            self._watch_repo(path)
+    
+    def _seed_discovery(self, path):
+        depth = len(Path(path).relative_to(self.root).parts)
+        if depth > self.DISCOVERY_DEPTH or self._in_watched_repo(path):
+            return
+        self._watch_discovery(path)
+        if depth == self.DISCOVERY_DEPTH:
+            return
+        try:
+            with os.scandir(path) as it:
+                subdirs = [entry.path for entry in it
+                           if entry.name != '.git' and entry.name not in GitPythonMonitor.SCAN_SKIP_DIRS
+                           and entry.is_dir(follow_symlinks=False)]
+        except OSError:
+            return
+        for subdir in subdirs:
+            self._seed_discovery(subdir)
+    
+    def start(self):
+        self.observer.start()
+        self.polling_observer.start()
+        self._thread.start()
+    
+    def stop(self):
+        self._requests.put((None, None))
+        self.observer.stop()
+        self.polling_observer.stop()
+    
+    def join(self):
+        self._thread.join()
+        self.observer.join()
+        self.polling_observer.join()
+
+class RepoDiscoveryHandler(FileSystemEventHandler):
+    """Start watching repositories created after startup"""
+    def __init__(self, watcher):
+        self.watcher = watcher
+    
+    def on_created(self, event):
+        if event.is_directory:
+            self._discover(event.src_path)
+    
+    def on_deleted(self, event):
+        if event.is_directory:
+            self.watcher.forget(event.src_path)
+    
+    def on_moved(self, event):
+        if event.is_directory:
+            self.watcher.forget(event.src_path)
+            self._discover(event.dest_path)
+    
+    def _discover(self, path):
+        path = path.rstrip('/')
+        if os.path.basename(path) == '.git':
+            self.watcher.handler.monitor.invalidate_repo_cache()
+            self.watcher.watch_repo(os.path.dirname(path))
+        else:
+            self.watcher.watch_discovery(path)
+
+def compress_log(path):
+    """Gzip a rotated log file, replacing the original"""
+    gz_path = f"{path}.gz"
+    with open(path, 'rb') as src, gzip.open(gz_path, 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(path)
+    return gz_path
+
+def _gcs_client():
+    """Return the shared GCS client, using the user's application default credentials"""
+    global _GCS
+    if _GCS is None:
+        _GCS = storage.Client()
+    return _GCS
 
 def upload_logs(monitor):
-    """Upload logs to Google Cloud Storage every 5 minutes"""
+    """Upload newly logged rows to Google Cloud Storage every 5 minutes"""
+    log_dir = os.path.dirname(monitor.log_file)
+    prefix = os.path.splitext(os.path.basename(monitor.log_file))[0] + '_'
     while True:
         try:
             time.sleep(monitor.upload_interval)
-            if os.path.exists(monitor.log_file):
-                filename = f"python_audit_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-                remote_path = f"{monitor.bucket_path}/{filename}"
-                
-                # Copy current log to timestamped file
-                timestamped_file = f"/tmp/{filename}"
-                subprocess.run(['cp', monitor.log_file, timestamped_file], check=True)
-                
-                # Upload to GCS using user's gcloud config
-                env = os.environ.copy()
-                
-                result = subprocess.run(['gsutil', 'cp', timestamped_file, remote_path], 
-                                      capture_output=True, text=True, env=env)
+            rotated = monitor.rotate_log()
+            if rotated:
+                compress_log(rotated)
+            
+            bucket = _gcs_client().bucket(monitor.bucket_name)
+            
+            # Upload this chunk along with any left over from earlier failures
+            for filename in sorted(os.listdir(log_dir)):
+                if not filename.startswith(prefix):
+                    continue
+                path = os.path.join(log_dir, filename)
+                if filename.endswith('.csv'):
+                    path = compress_log(path)
+                    filename = os.path.basename(path)
+                elif not filename.endswith('.csv.gz'):
+                    continue
                 
-                if result.returncode == 0:
+                blob = bucket.blob(filename)
+                try:
+                    # Stored as a plain .gz object (no Content-Encoding) so downloads stay
+                    # compressed; create-only, which makes retries safe
+                    blob.upload_from_filename(path, content_type='application/gzip',
+                                              if_generation_match=0, retry=DEFAULT_RETRY)
                     print(f"Successfully uploaded {filename} to GCS")
-                    # Clean up temp file
-                    os.remove(timestamped_file)
-                else:
-                    print(f"Failed to upload to GCS: {result.stderr}")
+                except PreconditionFailed:
+                    # Names are unique per host, so this is our own earlier upload
+                    print(f"{filename} already exists in GCS, skipping")
+                os.remove(path)
                     
         except Exception as e:
             print(f"Error uploading logs: {e}")
@@ -325,31 +786,23 @@ def upload_logs(monitor):
 def main():
     monitor = GitPythonMonitor()
     
-    # Start process monitoring thread
+    # Start process, git commit and Claude Code monitoring thread
     process_thread = threading.Thread(target=monitor.monitor_processes, daemon=True)
     process_thread.start()
     
-    # Start git command monitoring thread
-    git_monitor = GitCommitMonitor(monitor)
-    git_thread = threading.Thread(target=git_monitor.monitor_git_commands, daemon=True)
-    git_thread.start()
-    
-    # Start Claude Code prompt monitoring thread
-    def claude_monitor_loop():
-        while True:
-            monitor.monitor_claude_code_prompts()
-            time.sleep(10)
-    
-    claude_thread = threading.Thread(target=claude_monitor_loop, daemon=True)
-    claude_thread.start()
-    
-    # Start file watching
-    observer = Observer()
+    # Start file watching, scoped to the git repositories under /home
+    monitor.find_git_directories()
     handler = GitFileHandler(monitor)
+    watcher = RepoWatcher(handler)
+    # Start first so inotify errors surface from schedule() and can fall back to polling
+    watcher.start()
     
-    # Watch home directory and subdirectories
-    observer.schedule(handler, '/home', recursive=True)
-    observer.start()
+    for path in sorted(monitor.git_dirs):
+        if not path.endswith('.git'):
+            watcher.watch_repo(path)
+    
+    # Lightweight non-recursive watches to pick up newly created repositories
+    watcher.seed_discovery('/home')
     
     # Start log upload thread
     upload_thread = threading.Thread(target=upload_logs, args=(monitor,), daemon=True)
@@ -357,14 +810,18 @@ def main():
     
     print("Multi-language audit monitor started (Python, Node.js, VSCode, Claude Code)")
     
-    try:
-        while True:
-            time.sleep(10)
-    except KeyboardInterrupt:
-        observer.stop()
-        print("Multi-language audit monitor stopped")
+    # Block until SIGINT/SIGTERM instead of waking up periodically
+    stop = threading.Event()
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    stop.wait()
     
-    observer.join()
+    watcher.stop()
+    watcher.join()
+    # Daemon threads die with the interpreter, so write out what they still buffer
+    handler.flush()
+    monitor.close()
+    print("Multi-language audit monitor stopped")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -33,7 +33,7 @@ fi
 
 # Install packages in virtual environment
 echo "Installing Python packages in virtual environment..."
-sudo -u $REAL_USER "$VENV_PATH/bin/pip" install psutil watchdog
+sudo -u $REAL_USER "$VENV_PATH/bin/pip" install "psutil>=6.0" watchdog google-cloud-storage
 
 # Copy service file to systemd directory
 echo "Installing systemd service for user: $REAL_USER"